@@ -1,7 +1,12 @@
 import os
 
 PRESCRIPTION_NAME = os.path.join(os.getcwd(), 'prescription.txt')
-AUDIO_FILE = os.path.join(os.getcwd(), 'voice.mp3')
+CACHE_DIR = os.path.join(os.getcwd(), '.cache')
+AUDIO_CACHE_DIR = os.path.join(CACHE_DIR, 'tts')
+# most cached speech clips kept, least recently played are removed first
+AUDIO_CACHE_SIZE = 256
+MSG_CACHE_FILE = os.path.join(CACHE_DIR, 'msgs.json')
+TRANSLATION_CACHE_FILE = os.path.join(CACHE_DIR, 'translations')
 LLM_MODEL = 'gemini-pro'
 LLM_NAME = 'jarvis_backend'
 
@@ -17,11 +22,20 @@ LANGUAGES = {
     "telugu": "te",
     "urdu": "ur"
 }
+# precomputed dropdown choices
+LANGUAGE_KEYS = tuple(LANGUAGES.keys())
+GENDER_CHOICES = ("Male", "Female", "Prefer not to disclose")
+# genders passed through as selected, anything else is recorded as "Others"
+DISCLOSED_GENDERS = frozenset(GENDER_CHOICES[:2])
 
 DIAGNOSIS_TEMPLATE = """
 You are a doctor and detecting the cause of a problem mentioned by the patient.\
 You are supposed to ask 3 questions to help you detect the problem. The questions must be of highest quality.\
 Note: restrict one phrase to a single question
+Along with the questions, list the likely causes you are already considering.
+
+Respond only with a JSON object of the form:
+{"questions": ["<question>", "<question>", "<question>"], "preliminary_differential": ["<cause>", ...]}
 """
 
 MEDICATION_TEMPLATE = """
@@ -39,6 +53,7 @@ instructions:
 some additional details about the patient:
 age: {age}
 gender: {gender}
+preliminary differential: {differential}
 
 conversation: {conversation}
 Note: use bullet points
@@ -1,21 +1,17 @@
-import os
+import logging
 
 from consts import PRESCRIPTION_NAME
+from fileOps import atomic_write
+
+logger = logging.getLogger(__name__)
 
 
 class Prescription:
+    __slots__ = ('age', 'gender')
+
     def __init__(self, age: int, gender: str):
-        self.age = age,
+        self.age = age
         self.gender = gender
-        self.delete_file()
-    
-    def delete_file(self) -> None:
-        """
-        delete txt file
-        """
-        
-        if os.path.exists(path=PRESCRIPTION_NAME):
-            os.remove(path=PRESCRIPTION_NAME)
     
     def create_prescription(self, inital_msg: str, conversation: list, medication: str) -> None:
         """
@@ -28,17 +24,15 @@ class Prescription:
         """
         
         # create the conversation
-        dialog = f"YOU: {inital_msg}\n"
-        for _, conv in enumerate(conversation):
-            dialog += f"JARVIS: {conv[0]}\nYOU: {conv[1]}\n"
-        dialog += f"JARVIS: {medication}"
-
-        # write to txt file
-        if not os.path.exists(PRESCRIPTION_NAME):
-            content = f"AGE: {self.age}\nGENDER: {self.gender}\n\n{dialog}"
-            with open(file=PRESCRIPTION_NAME, mode='w', encoding='utf8') as f:
-                f.write(content)
-                f.close()
+        parts = [f"YOU: {inital_msg}\n"]
+        parts.extend(f"JARVIS: {conv[0]}\nYOU: {conv[1]}\n" for conv in conversation)
+        parts.append(f"JARVIS: {medication}")
+        dialog = "".join(parts)
+
+        content = f"AGE: {self.age}\nGENDER: {self.gender}\n\n{dialog}"
+
+        # the previous prescription is only ever replaced by a complete one
+        atomic_write(path=PRESCRIPTION_NAME, data=content.encode('utf8'))
         
-        print("created prescription...")
+        logger.info("created prescription...")
     
\ No newline at end of file
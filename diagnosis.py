@@ -1,12 +1,21 @@
+import json
+import logging
 import os
+import re
 
-import google.generativeai as genai
+from functools import lru_cache
 
-from typing import List
+from typing import (
+    TYPE_CHECKING, 
+    Iterator, 
+    List, 
+    Tuple
+)
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.memory import ChatMessageHistory
-from langchain.prompts import ChatPromptTemplate
+from langchain.schema import (
+    HumanMessage, 
+    SystemMessage
+)
 
 from consts import (
     LLM_MODEL, 
@@ -15,56 +24,115 @@ from consts import (
     MEDICATION_TEMPLATE
 )
 
-genai.configure(api_key=os.environ.get('GOOGLE_API_KEY'))
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+logger = logging.getLogger(__name__)
+
+# numbering in front of each generated question, e.g. "1." or "2)"
+_NUM_PREFIX = re.compile(r"^\s*\d+[.)]\s*")
+# markdown code fence the model sometimes wraps JSON responses in
+_CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+# one quoted item of a JSON list written on its own line
+_JSON_ITEM = re.compile(r'^\s*("(?:[^"\\]|\\.)*")\s*,?\s*$')
+# bound once, so rendering skips the prompt-template machinery
+_MEDICATION_FORMAT = MEDICATION_TEMPLATE.format
+# fixed system message, sent as-is with every diagnosis request
+_DIAGNOSIS_MESSAGE = SystemMessage(content=DIAGNOSIS_TEMPLATE)
+
+
+@lru_cache(maxsize=None)
+def get_llm() -> "ChatGoogleGenerativeAI":
+    """
+    configure Gemini-Pro once and share the client across all sessions,
+    built on first use so that the API key from .env is already loaded 
+    and the Google client libraries are only imported when needed
+
+    Returns:
+        ChatGoogleGenerativeAI: LLM client
+    """
+
+    # pylint: disable=import-outside-toplevel
+    import google.generativeai as genai
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    genai.configure(api_key=os.environ.get('GOOGLE_API_KEY'))
+    return ChatGoogleGenerativeAI(
+        name=LLM_NAME, 
+        temperature=0,
+        model=LLM_MODEL,
+        convert_system_message_to_human=True
+    )
 
 
 class DocJarvis:
     def __init__(self, age: int, gender: str):
         self.age = age
         self.gender = gender
-        self.history = ChatMessageHistory()
-        self.llm = ChatGoogleGenerativeAI(
-            name=LLM_NAME, 
-            temperature=0,
-            model=LLM_MODEL,
-            convert_system_message_to_human=True
-        )
-        self.medication_prompt = ChatPromptTemplate.from_messages(
-            messages=[
-                ("human", MEDICATION_TEMPLATE)
-            ]
-        )
-        self.diagnosis_prompt = ChatPromptTemplate.from_messages(
-            messages=[
-                ("system", DIAGNOSIS_TEMPLATE),
-                ("human", "{input}")
-            ]
-        )
+        self.differential = []
+        # (question, answer) pairs in English
+        self.conversation = []
+        # conversation rendered for the medication prompt, one entry per answer
+        self.conversation_lines = []
+        self.llm = get_llm()
 
-    def call_doc(self, conversation: list) -> str:
+    def add_response(self, question: str, answer: str) -> None:
         """
-        function to prescribe medication using Gemini-Pro
+        record the patient's answer to a diagnosis question, 
+        ignoring a repeated record of the same question
+
+        Params:
+            question (str): question asked by the doctor
+            answer (str): patient's answer in English
+        """
+
+        if self.conversation and self.conversation[-1][0] == question:
+            return
+        self.record_turn(question=question, answer=answer)
+
+    def record_turn(self, question: str, answer: str) -> None:
+        """
+        append an answer to the conversation and its rendering, 
+        so the medication prompt never re-renders earlier answers
 
         Params:
-            conversation (list): initial diagnosis results
+            question (str): question asked by the doctor
+            answer (str): patient's answer in English
+        """
+
+        self.conversation.append((question, answer))
+        self.conversation_lines.append(
+            f"\nQuestion {len(self.conversation)}: {question}\nResponse: {answer}"
+        )
+
+    def format_conversation(self) -> str:
+        """
+        render the recorded conversation for the medication prompt
+
+        Returns:
+            str: numbered questions and responses
+        """
+
+        if not self.conversation_lines:
+            return "the patient did not answer any questions"
+        return "\n".join(self.conversation_lines)
+
+    def call_doc(self) -> str:
+        """
+        function to prescribe medication using Gemini-Pro
         
         Returns:
             response (str): generated medication
         """
 
-        for _, conv in enumerate(conversation):
-            self.history.add_ai_message(conv[0])
-            self.history.add_user_message(conv[1])
-
-        chain = self.medication_prompt | self.llm
-        response = chain.invoke(
-            input={
-                "age": self.age, 
-                "gender": self.gender, 
-                "conversation": conversation
-            }
-        ).content
-        print(response)
+        prompt = _MEDICATION_FORMAT(
+            age=self.age, 
+            gender=self.gender, 
+            differential=", ".join(self.differential) or "none", 
+            conversation=self.format_conversation()
+        )
+        response = self.llm.invoke(input=[HumanMessage(content=prompt)]).content
+        logger.debug("medication:: %s", response)
         return response
 
     def perform_diagnosis(self, usr_msg: str) -> List[str]:
@@ -78,8 +146,131 @@ class DocJarvis:
             diag_ques (List): further questions generated from LLM
         """
 
-        chain = self.diagnosis_prompt | self.llm
-        response = chain.invoke(input={"input": usr_msg}).content
-        diag_ques = response.split("\n")
-        print("diagnosis results:: ", diag_ques)
-        return diag_ques
+        return list(self.stream_diagnosis(usr_msg=usr_msg))
+
+    def stream_diagnosis(self, usr_msg: str) -> Iterator[str]:
+        """
+        using Gemini-Pro ask further questions to the patient, yielding each 
+        question as soon as its line of the response has been generated
+
+        Params:
+            usr_msg (str): patient's input
+        
+        Yields:
+            str: further question generated from LLM
+        """
+
+        response = []
+        pending = ""
+        in_questions = False
+        asked = []
+        for chunk in self.llm.stream(input=[_DIAGNOSIS_MESSAGE, HumanMessage(content=usr_msg)]):
+            response.append(chunk.content)
+            *lines, pending = (pending + chunk.content).split("\n")
+            for line in lines:
+                ques, in_questions = self._read_line(line=line, in_questions=in_questions)
+                if self._is_new_question(ques=ques, asked=asked):
+                    asked.append(ques)
+                    yield ques
+        # the last line may not end with a line break
+        ques, _ = self._read_line(line=pending, in_questions=in_questions)
+        if self._is_new_question(ques=ques, asked=asked):
+            asked.append(ques)
+            yield ques
+
+        # the complete response settles what the line reader could not, e.g. single-line JSON, 
+        # matched by content since the two readings need not list questions in the same order
+        diag_ques = self._parse_response(response="".join(response))
+        logger.debug("diagnosis results:: %s", diag_ques)
+        for ques in diag_ques:
+            if self._is_new_question(ques=ques, asked=asked):
+                asked.append(ques)
+                yield ques
+
+    @staticmethod
+    def _is_new_question(ques: str, asked: List[str]) -> bool:
+        """
+        check if a question should be asked, the same rules apply 
+        to questions read while streaming and from the complete response
+
+        Params:
+            ques (str): candidate question
+            asked (List): questions already asked
+        
+        Returns:
+            bool: if the question is long enough, not asked yet, and fewer than 3 were asked
+        """
+
+        return len(ques) > 5 and ques not in asked and len(asked) < 3
+
+    @staticmethod
+    def _read_line(line: str, in_questions: bool) -> Tuple[str, bool]:
+        """
+        read a question from one line of a streamed response
+
+        Params:
+            line (str): line of the response
+            in_questions (bool): if the line is inside the JSON questions list
+        
+        Returns:
+            Tuple: question (empty if the line has none), 
+            and whether the next line is inside the questions list
+        """
+
+        if '"questions"' in line:
+            # the first item may share the line with the key, e.g. {"questions": ["...",
+            _, _, line = line.partition("[")
+            in_questions = True
+        if in_questions:
+            item = _JSON_ITEM.match(line)
+            if item is None:
+                return "", "]" not in line
+            try:
+                return json.loads(item.group(1)).strip(), True
+            except ValueError:
+                return "", True
+        if _NUM_PREFIX.match(line):
+            return _NUM_PREFIX.sub("", line).strip(), False
+        return "", False
+
+    def _parse_response(self, response: str) -> List[str]:
+        """
+        read the questions and the preliminary differential from the JSON response, 
+        falling back to one question per line if the model ignored the format
+
+        Params:
+            response (str): LLM response
+        
+        Returns:
+            List: cleaned questions
+        """
+
+        try:
+            parsed = json.loads(_CODE_FENCE.sub("", response))
+            questions = [str(ques).strip() for ques in parsed["questions"]]
+            causes = parsed.get("preliminary_differential", [])
+            if isinstance(causes, str):
+                causes = [causes]
+            self.differential = [str(cause).strip() for cause in causes]
+        except (ValueError, KeyError, TypeError):
+            return self._parse_questions(response=response)
+        return [ques for ques in questions if len(ques) > 5][:3]
+
+    @staticmethod
+    def _parse_questions(response: str) -> List[str]:
+        """
+        split LLM response into at most 3 questions, 
+        dropping numbering and lines too short to be a question, 
+        and any preamble when the questions are numbered
+
+        Params:
+            response (str): LLM response
+        
+        Returns:
+            List: cleaned questions
+        """
+
+        lines = response.splitlines()
+        numbered = [line for line in lines if _NUM_PREFIX.match(line)]
+        cleaned = (_NUM_PREFIX.sub("", line).strip() for line in numbered or lines)
+        return [ques for ques in cleaned if len(ques) > 5][:3]
@@ -0,0 +1,42 @@
+import os
+import threading
+
+# shared by every writer, so concurrent sessions and prewarm threads never interleave
+FILE_LOCK = threading.Lock()
+
+
+def delete_file(path: str) -> None:
+    """
+    delete a file if it exists, with a single unlink instead of checking first, 
+    unlinking is atomic so no lock is needed
+
+    Params:
+        path (str): file path
+    """
+
+    try:
+        os.remove(path=path)
+    except FileNotFoundError:
+        pass
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    write a file through a temporary file that is swapped in, 
+    so readers only ever see the previous or the complete content
+
+    Params:
+        path (str): file path
+        data (bytes): file content
+    """
+
+    os.makedirs(name=os.path.dirname(path), exist_ok=True)
+    tmp_file = f"{path}.tmp"
+    with FILE_LOCK:
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_file, path)
@@ -1,133 +1,291 @@
+import asyncio
+import logging
 import os
 
-import gradio as gr
+from concurrent.futures import ThreadPoolExecutor
+from functools import (
+    lru_cache, 
+    partial
+)
 
 from dotenv import (
     load_dotenv, 
     find_dotenv
 )
-from typing import List
+from typing import (
+    Any, 
+    AsyncIterator, 
+    Callable, 
+    List, 
+    Tuple
+)
 
-from consts import LANGUAGES
+from consts import (
+    DISCLOSED_GENDERS, 
+    GENDER_CHOICES, 
+    LANGUAGES, 
+    LANGUAGE_KEYS, 
+    PRESCRIPTION_NAME
+)
 from create_prescription import Prescription
 from speechOps import (
     Transcribe, 
     ToAudio
 )
-from perform_translation import Translate
+from perform_translation import (
+    Translate, 
+    load_messages, 
+    save_messages
+)
 from diagnosis import DocJarvis
 
 load_dotenv(dotenv_path=find_dotenv())
+logger = logging.getLogger(__name__)
+
+def prewarm() -> None:
+    """
+    translate and synthesise the static messages of every language 
+    ahead of the first session
+    """
+
+    def warm(lan_code: str) -> None:
+        try:
+            audio_ob = ToAudio(language=lan_code)
+            for msg in Translate(lan_code=lan_code).msgs:
+                audio_ob.get_audio(txt_msg=msg)
+        except Exception as err: # pylint: disable=broad-except
+            logger.warning("could not prewarm %s:: %s", lan_code, err)
+
+    # messages translated by a previous run need no network
+    load_messages()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        pool.map(warm, LANGUAGES.values())
+    save_messages()
+
+
+@lru_cache(maxsize=None)
+def get_services(lan_code: str) -> Tuple[Translate, ToAudio, Transcribe]:
+    """
+    create the translation and speech objects of a language once, 
+    reused by every later session in that language
+
+    Params:
+        lan_code (str): language code
+    
+    Returns:
+        Tuple: translation, text to speech and transcription objects
+    """
+
+    return (
+        Translate(lan_code=lan_code), 
+        ToAudio(language=lan_code), 
+        Transcribe(language=lan_code)
+    )
+
+
+async def run_blocking(func: Callable, **kwargs) -> Any:
+    """
+    run a blocking network/audio call on the default thread pool
+
+    Params:
+        func (Callable): blocking function
+        kwargs: arguments for the function
+    
+    Returns:
+        Any: result of the function
+    """
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(func, **kwargs))
+
+
+async def run_streaming(func: Callable, **kwargs) -> AsyncIterator[Any]:
+    """
+    run a blocking generator on the default thread pool, 
+    handing over each item as soon as it is produced
 
-def main(language: str, gender: List, age: str) -> str:
+    Params:
+        func (Callable): generator function
+        kwargs: arguments for the function
+    
+    Yields:
+        Any: items of the generator
+    """
+
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    finished = object()
+
+    def produce() -> None:
+        try:
+            for item in func(**kwargs):
+                loop.call_soon_threadsafe(items.put_nowait, item)
+        finally:
+            loop.call_soon_threadsafe(items.put_nowait, finished)
+
+    producer = loop.run_in_executor(None, produce)
+    while True:
+        item = await items.get()
+        if item is finished:
+            break
+        yield item
+    # surface errors raised by the generator
+    await producer
+
+
+async def main(language: str, gender: List, age: str) -> str:
     """
     user profile/dashboard
     """
 
-    symptoms = []
-    translated_symptoms = []
-    translated_diag_res = []
+    translated_conversation = []
     
-    print("chosen language:: ", language)
+    logger.info("chosen language:: %s", language)
     # get language code
     lan_code = LANGUAGES.get(language, 'en')
+    # resolve gender once, shared by the doctor and the prescription
+    gender = gender[0] if gender and gender[0] in DISCLOSED_GENDERS else "Others"
 
     # create class objects
-    translate_ob = Translate(lan_code=lan_code)
-    audio_ob = ToAudio(language=lan_code)
+    translate_ob, audio_ob, transcribe_ob = await run_blocking(get_services, lan_code=lan_code)
     prescription_ob = Prescription(
         age=age,
-        gender=gender[0] if gender[0] in ["Male", "Female"] else "Others"
-    )
-    transcribe_ob = Transcribe(language=lan_code)
-    doc_ob = DocJarvis(
-        age=age, 
         gender=gender
     )
+    # the first one imports and configures the Gemini client, kept off the event loop
+    doc_ob = await run_blocking(DocJarvis, age=age, gender=gender)
+
+    def translate(text: str, llm_flag: bool, save: bool = False) -> asyncio.Future:
+        """
+        start translating in the background, awaited only when the text is needed
+        """
+
+        if lan_code == 'en':
+            done = asyncio.get_running_loop().create_future()
+            done.set_result(text)
+            return done
+        return asyncio.ensure_future(
+            run_blocking(translate_ob.translation, for_usr=text, llm_flag=llm_flag, save=save)
+        )
     
     # get all static messages
-    all_msgs = translate_ob.get_msgs()
+    all_msgs = translate_ob.msgs
 
     # send introduction message to user
-    audio_ob.text_to_speech(txt_msg=all_msgs[0])
+    await run_blocking(audio_ob.text_to_speech, txt_msg=all_msgs[0], block=False)
     # send instruction message to user
-    audio_ob.text_to_speech(txt_msg=all_msgs[1])
+    await run_blocking(audio_ob.text_to_speech, txt_msg=all_msgs[1], block=False)
 
-    # get user message
-    user_text = transcribe_ob.get_text()
+    # get user message, once the speaker is quiet
+    await run_blocking(audio_ob.wait)
+    user_text = await run_blocking(transcribe_ob.get_text)
     if user_text == "NO INTERNET CONNECTION":
         return "please connect to the internet"
+    if not user_text:
+        return "could not understand you, please try again"
     # translate to English for LLM model
-    for_doc = translate_ob.translation(
-        for_usr=user_text, 
-        llm_flag=True
-    ) if not lan_code == 'en' else user_text
-    print("initial words::", for_doc)
-    # call LLM and find medication
-    diagnosis_res = doc_ob.perform_diagnosis(usr_msg=for_doc)
+    for_doc = await translate(text=user_text, llm_flag=True)
+    logger.debug("initial words:: %s", for_doc)
+    # call LLM for further questions, translating each to user language as soon 
+    # as it is generated, so the first one is asked while the rest are still written
+    questions = asyncio.Queue()
+
+    async def prefetch_audio(doc_notes_task: asyncio.Future) -> str:
+        # synthesise each question as soon as it is translated, not when it is asked
+        doc_notes = await doc_notes_task
+        await run_blocking(audio_ob.get_audio, txt_msg=doc_notes)
+        return doc_notes
+
+    async def collect_questions() -> None:
+        try:
+            async for diag_ques in run_streaming(doc_ob.stream_diagnosis, usr_msg=for_doc):
+                # generated questions hold no patient's words, kept for later runs
+                doc_notes_task = translate(text=diag_ques, llm_flag=False, save=True)
+                await questions.put((diag_ques, asyncio.ensure_future(prefetch_audio(doc_notes_task))))
+        finally:
+            await questions.put(None)
+
+    collector = asyncio.ensure_future(collect_questions())
+    # tell the user meanwhile
+    await run_blocking(audio_ob.text_to_speech, txt_msg=all_msgs[2], block=False)
+    # bound once for the conversation loop
+    speak = audio_ob.text_to_speech
+    listen = transcribe_ob.get_text
+    add_response = doc_ob.add_response
+
+    async def record(diag_ques: str, symptom_task: asyncio.Future) -> None:
+        symptom = await symptom_task
+        logger.debug("answer:: %s", symptom)
+        await run_blocking(add_response, question=diag_ques, answer=symptom)
+
+    # answer still being translated, recorded once the next question has been asked
+    pending = None
 
     # perform conversation
-    for _, diag_ques in enumerate(diagnosis_res):
-
-        if not diag_ques:
-            continue
-
-        # translate results to user language
-        doc_notes = translate_ob.translation(
-            for_usr=diag_ques, 
-            llm_flag=False
-        ) if not lan_code == 'en' else diag_ques
-        translated_diag_res.append(doc_notes)
-        # generate audio message
-        audio_ob.text_to_speech(txt_msg=doc_notes)
+    while True:
+        question = await questions.get()
+        if question is None:
+            break
+        # translated and already synthesised while earlier questions were asked
+        diag_ques, doc_notes = question[0], await question[1]
+
+        # generate audio message, recording the previous answer while it plays
+        if pending is None:
+            await run_blocking(speak, txt_msg=doc_notes)
+        else:
+            await asyncio.gather(run_blocking(speak, txt_msg=doc_notes), record(*pending))
+            pending = None
         
         # receive input from user
-        symptom = transcribe_ob.get_text()
-        if not symptom == "NO INTERNET CONNECTION":
-            translated_symptoms.append(symptom)
-            # translate to English for LLM
-            symptom = translate_ob.translation(
-                for_usr=symptom,
-                llm_flag=True
-            ) if not lan_code == 'en' else symptom
-            print(symptom)
-            symptoms.append(symptom)
-    conversation = list(zip(diagnosis_res, symptoms))
-    translated_conversation = list(zip(translated_diag_res, translated_symptoms))
+        symptom = await run_blocking(listen)
+        if symptom and not symptom == "NO INTERNET CONNECTION":
+            # keep each answer with its own question
+            translated_conversation.append((doc_notes, symptom))
+            # translate to English for LLM while the next question is asked
+            pending = (diag_ques, translate(text=symptom, llm_flag=True))
+    await collector
+    if pending is not None:
+        await record(*pending)
     
     # get medication using LLM
-    medication = doc_ob.call_doc(conversation=conversation)
-    medication = translate_ob.translation(
-        for_usr=medication,
-        llm_flag=False
-    ) if not lan_code == 'en' else medication
+    medication = await run_blocking(doc_ob.call_doc)
+    medication = await translate(text=medication, llm_flag=False)
     
     # create prescription
-    prescription_ob.create_prescription(
-        inital_msg = user_text,
-        conversation = translated_conversation,
-        medication = medication
+    await run_blocking(
+        prescription_ob.create_prescription, 
+        inital_msg=user_text, 
+        conversation=translated_conversation, 
+        medication=medication
     )
-    # generate audio
-    audio_ob.text_to_speech(txt_msg=medication)
+    # generate audio, the prescription path is returned while it plays
+    await run_blocking(audio_ob.text_to_speech, txt_msg=medication, block=False)
     
-    return prescription_ob.prescription_file
+    return PRESCRIPTION_NAME
 
 
-if __name__ == '__main__':
-    # create UI
-    ui=gr.Interface(
+def create_interface() -> "gradio.Interface":
+    """
+    create the Gradio UI, importing Gradio only when the UI is built
+
+    Returns:
+        gr.Interface: user interface
+    """
+
+    import gradio as gr # pylint: disable=import-outside-toplevel
+
+    return gr.Interface(
         fn=main,
         inputs=[
             gr.Dropdown(
-                choices=list(LANGUAGES.keys()),
+                choices=LANGUAGE_KEYS,
                 multiselect=False,
                 label="language selection",
                 show_label=True,
                 interactive=True
             ),
             gr.CheckboxGroup(
-                choices=["Male", "Female", "Prefer not to disclose"],
+                choices=GENDER_CHOICES,
                 label="gender selection",
                 show_label=True,
                 interactive=True,
@@ -143,6 +301,14 @@ if __name__ == '__main__':
         ],
         outputs=["text"]
     )
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    # cache static messages and audio before accepting users
+    prewarm()
+    # create UI
+    ui = create_interface()
     # launch the UI
     ui.launch(
         server_name=os.getenv(key='GRADIO_SERVER_NAME'), 
@@ -1,31 +1,172 @@
-from googletrans import Translator
+import atexit
+import hashlib
+import json
+import logging
+import os
+import shelve
+import threading
 
-from typing import List
+from functools import lru_cache
+
+from deep_translator import GoogleTranslator
+
+from typing import (
+    Dict, 
+    List
+)
+
+from consts import (
+    MSG_CACHE_FILE, 
+    TRANSLATION_CACHE_FILE
+)
+from fileOps import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# translated static messages, shared by every session with the same language
+_MSG_CACHE: Dict[str, List[str]] = {}
+# translations of earlier runs on disk, shelve is not safe for concurrent use
+_SHELF_LOCK = threading.Lock()
+
+
+def load_messages() -> None:
+    """
+    load the static messages translated by a previous run
+    """
+
+    if not os.path.exists(MSG_CACHE_FILE):
+        return
+    try:
+        with open(file=MSG_CACHE_FILE, mode='r', encoding='utf8') as f:
+            _MSG_CACHE.update(json.load(f))
+    except ValueError:
+        logger.warning("ignoring unreadable message cache")
+
+
+def save_messages() -> None:
+    """
+    save the translated static messages for the next run
+    """
+
+    atomic_write(
+        path=MSG_CACHE_FILE, 
+        data=json.dumps(_MSG_CACHE, ensure_ascii=False).encode('utf8')
+    )
+
+
+@lru_cache(maxsize=None)
+def open_translations() -> shelve.Shelf:
+    """
+    open the translations saved by previous runs once, closed when the app exits
+
+    Returns:
+        shelve.Shelf: saved translations by key
+    """
+
+    os.makedirs(name=os.path.dirname(TRANSLATION_CACHE_FILE), exist_ok=True)
+    shelf = shelve.open(TRANSLATION_CACHE_FILE)
+    atexit.register(shelf.close)
+    return shelf
+
+
+@lru_cache(maxsize=2048)
+def _translate(source: str, target: str, text: str) -> str:
+    """
+    translate text, remembering recent results so repeated phrases skip the network
+
+    Params:
+        source (str): source language code
+        target (str): target language code
+        text (str): input text
+    
+    Returns:
+        str: translated text
+    """
+
+    # built per call, a translator keeps the text of its request on the instance
+    return GoogleTranslator(source=source, target=target).translate(text=text)
+
+
+def _translate_saved(source: str, target: str, text: str) -> str:
+    """
+    translate text that holds no patient data, remembering results on disk, 
+    so phrases repeated in an earlier run skip the network
+
+    Params:
+        source (str): source language code
+        target (str): target language code
+        text (str): input text
+    
+    Returns:
+        str: translated text
+    """
+
+    key = hashlib.sha1(f"{source}|{target}|{text}".encode('utf8')).hexdigest()
+    # opened under the lock, so threads starting together share one handle
+    with _SHELF_LOCK:
+        shelf = open_translations()
+        translated = shelf.get(key)
+    if translated is not None:
+        return translated
+    translated = _translate(source=source, target=target, text=text)
+    if translated is not None:
+        with _SHELF_LOCK:
+            shelf[key] = translated
+    return translated
 
 
 class Translate:
     def __init__(self, lan_code: str):
         self.lan_code = lan_code
-        self.translator = Translator()
         self.msgs = self.get_msgs()
     
-    def translation(self, for_usr: str, llm_flag: bool) -> str:
+    def translation(self, for_usr: str, llm_flag: bool, save: bool = False) -> str:
         """
         translate from one language to another using Google Translate
         
         Params:
             for_usr (str): input text
             llm_flag (bool): if message is intended for LLM model
+            save (bool): keep the translation for later runs, never for patient's answers
         
         Returns:
             translation (str): translated text
         """
         
-        translated_txt = self.translator.translate(
-            text=for_usr, 
-            dest=self.lan_code if not llm_flag else 'en'
+        text = for_usr.strip()
+        # nothing to translate, or the user already speaks English
+        if not text or self.lan_code == 'en':
+            return text
+        translate = _translate_saved if save else _translate
+        return translate(
+            source='auto', 
+            target=self.lan_code if not llm_flag else 'en', 
+            text=text
         )
-        return translated_txt.text
+    
+    def translation_batch(self, for_usr: List[str], llm_flag: bool, save: bool = False) -> List[str]:
+        """
+        translate several single-line texts with one Google Translate request
+        
+        Params:
+            for_usr (List): input texts
+            llm_flag (bool): if messages are intended for LLM model
+            save (bool): keep the translations for later runs, never for patient's answers
+        
+        Returns:
+            List: translated texts, in input order
+        """
+
+        if not for_usr or self.lan_code == 'en':
+            return [text.strip() for text in for_usr]
+        joined = self.translation(for_usr="\n".join(for_usr), llm_flag=llm_flag, save=save)
+        translated = [line.strip() for line in joined.split("\n") if line.strip()]
+        if not len(translated) == len(for_usr):
+            # line breaks were not preserved, translate one by one
+            return [
+                self.translation(for_usr=text, llm_flag=llm_flag, save=save) for text in for_usr
+            ]
+        return translated
     
     def get_msgs(self) -> List[str]:
         """
@@ -35,6 +176,9 @@ class Translate:
             List: all messages
         """
         
+        if self.lan_code in _MSG_CACHE:
+            return _MSG_CACHE[self.lan_code]
+
         # introduction message
         MAIN_MSG = "send message from microphone. To stop, say 'thanks'"
         # instruction message
@@ -42,8 +186,9 @@ class Translate:
         # diagnosis message
         DIAG_MSG = "performing diagnosis"
 
-        # perform message translation
-        main_message = self.translation(for_usr=MAIN_MSG, llm_flag=False) if not self.lan_code == 'en' else MAIN_MSG
-        instr_message = self.translation(for_usr=INSTR_MSG, llm_flag=False) if not self.lan_code == 'en' else INSTR_MSG
-        diag_message = self.translation(for_usr=DIAG_MSG, llm_flag=False) if not self.lan_code == 'en' else DIAG_MSG
-        return [main_message, instr_message, diag_message]
+        msgs = [MAIN_MSG, INSTR_MSG, DIAG_MSG]
+        if not self.lan_code == 'en':
+            # one request for all messages, translate_batch sends one per message
+            msgs = self.translation_batch(for_usr=msgs, llm_flag=False, save=True)
+        _MSG_CACHE[self.lan_code] = msgs
+        return msgs
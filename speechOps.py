@@ -1,67 +1,764 @@
+import atexit
+import hashlib
+import io
+import json
+import logging
 import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import wave
 
-import playsound
-import speech_recognition as sr
+from collections import OrderedDict
+from concurrent.futures import (
+    ThreadPoolExecutor, 
+    TimeoutError as FutureTimeoutError
+)
+from datetime import timedelta
+from functools import lru_cache
+from importlib.util import find_spec
 
-from gtts import gTTS
+from typing import (
+    TYPE_CHECKING, 
+    Callable, 
+    Dict, 
+    Optional, 
+    Tuple
+)
 
-from consts import AUDIO_FILE
+from consts import (
+    AUDIO_CACHE_DIR, 
+    AUDIO_CACHE_SIZE
+)
+from fileOps import (
+    atomic_write, 
+    delete_file
+)
 
+if TYPE_CHECKING:
+    import speech_recognition as sr
+    import vosk
 
+    from google.cloud import speech
+    from piper.voice import PiperVoice
+
+try:
+    import miniaudio
+except ImportError:
+    miniaudio = None
+
+try:
+    from pydub import AudioSegment
+    from pydub.exceptions import CouldntDecodeError
+except ImportError:
+    AudioSegment = None
+
+logger = logging.getLogger(__name__)
+
+
+def is_installed(module: str) -> bool:
+    """
+    check if an optional library is installed without importing it, 
+    heavy backends are only imported by the loader that uses them
+
+    Params:
+        module (str): dotted module name
+    
+    Returns:
+        bool: if the module can be imported
+    """
+
+    try:
+        return find_spec(module) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+# cached speech clips by key, least recently played first
+_AUDIO_INDEX: "OrderedDict[str, str]" = OrderedDict()
+_AUDIO_INDEX_LOCK = threading.Lock()
+
+
+def _load_audio_index() -> None:
+    """
+    index the speech clips cached by previous runs, oldest first
+    """
+
+    if not os.path.isdir(AUDIO_CACHE_DIR):
+        return
+    clips = sorted(os.scandir(AUDIO_CACHE_DIR), key=lambda clip: clip.stat().st_mtime)
+    for clip in clips:
+        key, ext = os.path.splitext(clip.name)
+        if ext in ('.mp3', '.wav'):
+            _AUDIO_INDEX[key] = clip.path
+
+
+def _remember_audio(key: str, audio_file: str) -> None:
+    """
+    add a speech clip to the index, removing the least recently played 
+    clips once the cache is full
+
+    Params:
+        key (str): cache key of the clip
+        audio_file (str): path of the clip
+    """
+
+    with _AUDIO_INDEX_LOCK:
+        _AUDIO_INDEX[key] = audio_file
+        _AUDIO_INDEX.move_to_end(key)
+        evicted = [
+            _AUDIO_INDEX.popitem(last=False)[1] 
+            for _ in range(len(_AUDIO_INDEX) - AUDIO_CACHE_SIZE)
+        ]
+    for path in evicted:
+        delete_file(path=path)
+
+
+_load_audio_index()
+
+
+# command line players by preference, with the audio formats each can play
+PLAYERS = (
+    (("afplay",), ('.mp3', '.wav')),
+    (("ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet"), ('.mp3', '.wav')),
+    (("mpg123", "-q"), ('.mp3',)),
+    (("mpg321", "-q"), ('.mp3',)),
+    (("aplay", "-q"), ('.wav',))
+)
+
+
+@lru_cache(maxsize=None)
+def resolve_players() -> Dict[str, Tuple[str, ...]]:
+    """
+    find the installed player for each audio format once, 
+    instead of probing for players on every message
+
+    Returns:
+        Dict: player command by file extension, formats without a player are left out
+    """
+
+    players = {}
+    for cmd, formats in PLAYERS:
+        if shutil.which(cmd[0]) is None:
+            continue
+        for ext in formats:
+            players.setdefault(ext, cmd)
+    return players
+
+
+# command line players that can decode MP3 from stdin, by preference
+STREAM_PLAYERS = (
+    ("mpg123", "-q", "-"),
+    ("mpg321", "-q", "-"),
+    ("ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "-i", "pipe:0")
+)
+
+
+@lru_cache(maxsize=None)
+def resolve_stream_player() -> Optional[Tuple[str, ...]]:
+    """
+    find the installed player that speech can be streamed into, once
+
+    Returns:
+        Tuple: player command, None if no such player is installed
+    """
+
+    return next((cmd for cmd in STREAM_PLAYERS if shutil.which(cmd[0])), None)
+
+
+# audio queued in the playback device, still to be heard once the last frames are handed over
+DEVICE_BUFFER_MSEC = 200
+
+
+class _PlayerFeed(io.BytesIO):
+    """
+    buffer that also forwards every write to a player's stdin, 
+    so speech plays while it downloads and is still cached afterwards
+    """
+
+    def __init__(self, pipe):
+        super().__init__()
+        self.pipe = pipe
+
+    def write(self, data: bytes) -> int:
+        if self.pipe is not None:
+            try:
+                self.pipe.write(data)
+                self.pipe.flush()
+            except BrokenPipeError:
+                # player exited early, keep buffering for the cache
+                self.pipe = None
+        return super().write(data)
+
+    def close_pipe(self) -> None:
+        """
+        signal the end of the audio to the player
+        """
+
+        if self.pipe is not None:
+            try:
+                self.pipe.close()
+            except BrokenPipeError:
+                pass
+            self.pipe = None
+
+
+@lru_cache(maxsize=None)
+def get_speech_client() -> "speech.SpeechClient":
+    """
+    open the Google Cloud Speech client once, sharing its gRPC channel across sessions
+
+    Returns:
+        speech.SpeechClient: streaming recognition client
+    """
+
+    from google.cloud import speech # pylint: disable=import-outside-toplevel
+
+    return speech.SpeechClient()
+
+
+@lru_cache(maxsize=None)
+def get_vosk_model(language: str) -> Optional["vosk.Model"]:
+    """
+    load the offline recognition model of a language once, 
+    from the directory named after the language code in VOSK_MODEL_DIR
+
+    Params:
+        language (str): language code
+    
+    Returns:
+        vosk.Model: recognition model, None if vosk or the model is not installed
+    """
+
+    model_dir = os.environ.get('VOSK_MODEL_DIR')
+    if not model_dir or not is_installed('vosk'):
+        return None
+    model_path = os.path.join(model_dir, language)
+    if not os.path.isdir(model_path):
+        return None
+
+    import vosk # pylint: disable=import-outside-toplevel
+
+    return vosk.Model(model_path)
+
+
+@lru_cache(maxsize=None)
+def open_microphone() -> "sr.Microphone":
+    """
+    open the microphone stream once and keep it open for every turn, 
+    instead of paying the PortAudio open and close on each answer
+
+    Returns:
+        sr.Microphone: open microphone source
+    """
+
+    import speech_recognition as sr # pylint: disable=import-outside-toplevel
+
+    source = sr.Microphone().__enter__() # pylint: disable=unnecessary-dunder-call
+    atexit.register(close_microphone)
+    return source
+
+
+def close_microphone() -> None:
+    """
+    close the microphone stream opened by open_microphone, if any
+    """
+
+    if open_microphone.cache_info().currsize:
+        open_microphone().__exit__(None, None, None)
+        open_microphone.cache_clear()
+
+
+def drain_microphone(source: "sr.Microphone") -> None:
+    """
+    discard audio buffered since the last turn, 
+    e.g. the assistant's own voice, so listening starts from now
+
+    Params:
+        source (sr.Microphone): open microphone source
+    """
+
+    available = source.stream.pyaudio_stream.get_read_available()
+    if available:
+        source.stream.read(available)
+
+
+@lru_cache(maxsize=None)
+def get_piper_voice(language: str) -> Optional["PiperVoice"]:
+    """
+    load the local speech synthesis voice of a language once, 
+    from the file named after the language code in PIPER_MODEL_DIR
+
+    Params:
+        language (str): language code
+    
+    Returns:
+        PiperVoice: synthesis voice, None if piper or the voice is not installed
+    """
+
+    model_dir = os.environ.get('PIPER_MODEL_DIR')
+    if not model_dir or not is_installed('piper'):
+        return None
+    model_path = os.path.join(model_dir, f"{language}.onnx")
+    if not os.path.isfile(model_path):
+        return None
+
+    from piper.voice import PiperVoice # pylint: disable=import-outside-toplevel
+
+    return PiperVoice.load(model_path)
+
+
+# online and offline recognition of the same answer run side by side
+_RECOGNITION_POOL = ThreadPoolExecutor(max_workers=4)
+
+
+# pylint: disable=import-outside-toplevel
+# the audio libraries are imported on first use, keeping them off the startup path
 class Transcribe:
-    def __init__(self, language: str):
+    def __init__(
+        self, 
+        language: str, 
+        pause_threshold: float = 0.5, 
+        non_speaking_duration: float = 0.3, 
+        phrase_threshold: float = 0.2, 
+        online_timeout: float = 3.0, 
+        prefer_offline: bool = False
+    ):
+        import speech_recognition as sr
+
         self.language=language
-        # initialise recogniser
+        # initialise recogniser, ending a phrase after half a second of silence 
+        # (library defaults wait 0.8s), trade these for accuracy if answers get cut off
         self.recognizer = sr.Recognizer()
-        # initialise microphone
-        self.mic = sr.Microphone()
+        self.recognizer.pause_threshold = pause_threshold
+        self.recognizer.non_speaking_duration = non_speaking_duration
+        self.recognizer.phrase_threshold = phrase_threshold
+        # streaming recogniser, used when Google Cloud credentials are configured
+        self.client = None
+        if os.environ.get('GOOGLE_APPLICATION_CREDENTIALS') and is_installed('google.cloud.speech'):
+            self.client = get_speech_client()
+        # offline recogniser, answers when Google is slower than online_timeout or unreachable
+        self.vosk_model = get_vosk_model(language=language)
+        self.online_timeout = online_timeout
+        self.prefer_offline = prefer_offline
+        # calibrated for ambient noise on first listen, the microphone rarely moves 
+        # between turns and the recogniser adapts its threshold to drift while listening
+        self.recognizer.dynamic_energy_threshold = True
+        self.calibrated = False
+    
+    def recalibrate(self) -> None:
+        """
+        sample ambient noise to set the energy threshold used while listening
+        """
+
+        self.recognizer.adjust_for_ambient_noise(source=open_microphone(), duration=0.5)
+        self.calibrated = True
     
-    def get_text(self) -> None:
+    def get_text(self, on_partial: Optional[Callable[[str], None]] = None) -> str:
         """
         convert audio from microphone to text 
+
+        Params:
+            on_partial (Callable): called with interim transcripts, streaming only
+        
+        Returns:
+            transcribed_txt (str): transcribed text, empty if nothing was understood
         """
 
-        with self.mic as source:
-            try:
-                self.recognizer.adjust_for_ambient_noise(source=source)
-                audio = self.recognizer.listen(source=source)
-                transcribed_txt = self.recognizer.recognize_google(
-                    audio_data=audio, 
-                    language=self.language
-                )
-                print("received audio")
-                return transcribed_txt
-            except sr.RequestError:
-                return "NO INTERNET CONNECTION"
+        if self.client is not None:
+            return self.stream_text(on_partial=on_partial)
+
+        source = open_microphone()
+        # calibrate on the room as it is now, not on the buffered end of the last prompt
+        drain_microphone(source=source)
+        if not self.calibrated:
+            self.recalibrate()
+        audio = self.recognizer.listen(source=source)
+
+        if self.vosk_model is None:
+            return self.recognize_online(audio=audio)
+        if self.prefer_offline:
+            return self.recognize_offline(audio=audio)
+        # Google is preferred, the local transcript is ready if it is slow or unreachable
+        offline = _RECOGNITION_POOL.submit(self.recognize_offline, audio=audio)
+        online = _RECOGNITION_POOL.submit(self.recognize_online, audio=audio)
+        try:
+            transcribed_txt = online.result(timeout=self.online_timeout)
+        except FutureTimeoutError:
+            # still on its way
+            transcribed_txt = None
+        if transcribed_txt and not transcribed_txt == "NO INTERNET CONNECTION":
+            return transcribed_txt
+        offline_txt = offline.result()
+        if offline_txt:
+            return offline_txt
+        # nothing understood locally, Google's late answer is the only one left
+        return online.result() if transcribed_txt is None else transcribed_txt
+    
+    def recognize_online(self, audio: "sr.AudioData") -> str:
+        """
+        transcribe recorded audio with Google Speech Recognition
+
+        Params:
+            audio (sr.AudioData): recorded answer
+        
+        Returns:
+            transcribed_txt (str): transcribed text, empty if nothing was understood
+        """
+
+        import speech_recognition as sr
+
+        try:
+            transcribed_txt = self.recognizer.recognize_google(
+                audio_data=audio, 
+                language=self.language
+            )
+            logger.info("received audio")
+            return transcribed_txt
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError:
+            return "NO INTERNET CONNECTION"
+    
+    def recognize_offline(self, audio: "sr.AudioData") -> str:
+        """
+        transcribe recorded audio locally with Vosk
+
+        Params:
+            audio (sr.AudioData): recorded answer
+        
+        Returns:
+            transcribed_txt (str): transcribed text, empty if nothing was understood
+        """
+
+        import vosk
+
+        recognizer = vosk.KaldiRecognizer(self.vosk_model, 16000)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=16000, convert_width=2))
+        return json.loads(recognizer.FinalResult()).get("text", "")
+    
+    def stream_text(self, on_partial: Optional[Callable[[str], None]] = None) -> str:
+        """
+        stream audio from microphone to Google Cloud Speech in 100 ms chunks, 
+        so the transcript is final shortly after the user stops speaking
+
+        Params:
+            on_partial (Callable): called with interim transcripts
+        
+        Returns:
+            transcribed_txt (str): transcribed text
+        """
+
+        from google.api_core.exceptions import GoogleAPICallError
+        from google.cloud import speech
+
+        source = open_microphone()
+        drain_microphone(source=source)
+        config = speech.StreamingRecognitionConfig(
+            config=speech.RecognitionConfig(
+                encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+                sample_rate_hertz=source.SAMPLE_RATE,
+                # Cloud Speech expects a region, all languages are offered for India
+                language_code=f"{self.language}-IN"
+            ),
+            interim_results=True,
+            single_utterance=True,
+            # finalise after the same silence as the offline recogniser
+            enable_voice_activity_events=True,
+            voice_activity_timeout=speech.StreamingRecognitionConfig.VoiceActivityTimeout(
+                speech_end_timeout=timedelta(seconds=self.recognizer.pause_threshold)
+            )
+        )
+        chunk_size = source.SAMPLE_RATE // 10
+        chunks = queue.Queue()
+        stop = threading.Event()
+
+        def capture():
+            # read the microphone on its own thread, so recording never waits on the upload
+            while not stop.is_set():
+                chunks.put(source.stream.read(chunk_size))
+            chunks.put(None)
+
+        def audio_chunks():
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    return
+                yield speech.StreamingRecognizeRequest(audio_content=chunk)
+
+        recorder = threading.Thread(target=capture, daemon=True)
+        recorder.start()
+        try:
+            responses = self.client.streaming_recognize(
+                config=config, 
+                requests=audio_chunks()
+            )
+            for response in responses:
+                for result in response.results:
+                    transcribed_txt = result.alternatives[0].transcript
+                    if result.is_final:
+                        logger.info("received audio")
+                        return transcribed_txt
+                    if on_partial is not None:
+                        on_partial(transcribed_txt)
+        except GoogleAPICallError:
+            return "NO INTERNET CONNECTION"
+        finally:
+            stop.set()
+            # the next turn must not share the microphone with this recorder
+            recorder.join()
+        # stream ended without a final result, nothing intelligible was said
+        return ""
 
 
 class ToAudio:
     def __init__(self, language: str):
         self.language = language
-        self.delete_file()
+        self.players = resolve_players()
+        self.stream_cmd = resolve_stream_player()
+        # local synthesis voice, Google Text to Speech is used for languages without one
+        self.voice = get_piper_voice(language=language)
+        # output device kept open across messages once the first one is played, 
+        # when miniaudio is installed
+        self.device = None
+        # playback of the current message: finished event of the device, 
+        # player process or playsound thread
+        self.playback = None
+    
+    def cache_key(self, txt_msg: str, slow: bool) -> str:
+        """
+        key of the cached speech clip for a text message
+
+        Params:
+            txt_msg (str): text message
+            slow (bool): read the message slowly
+        
+        Returns:
+            str: cache key
+        """
+
+        digest = hashlib.sha1(f"{self.language}|{slow}|{txt_msg}".encode('utf8')).hexdigest()
+        # clips of the two synthesisers sound different, they are cached apart
+        return f"piper_{digest}" if self.voice is not None else f"tts_{digest}"
     
-    def delete_file(self) -> None:
+    @staticmethod
+    def cached_audio(key: str) -> Optional[str]:
         """
-        delete audio file
+        look up a cached speech clip, marking it as recently played
+
+        Params:
+            key (str): cache key
+        
+        Returns:
+            str: path of the clip, None if it is not cached
         """
 
-        if os.path.exists(path=AUDIO_FILE):
-            with open(file=AUDIO_FILE, mode='rb') as f:
-                f.close()
-            os.remove(path=AUDIO_FILE)
+        with _AUDIO_INDEX_LOCK:
+            if key not in _AUDIO_INDEX:
+                return None
+            _AUDIO_INDEX.move_to_end(key)
+            return _AUDIO_INDEX[key]
     
-    def text_to_speech(self, txt_msg: str) -> None:
+    @staticmethod
+    def store_audio(key: str, data: bytes, audio_format: str = 'mp3') -> str:
         """
-        using Google Text to Speech module, 
-        recite a text in a given language
+        cache synthesised speech, MP3 is stored as WAV when pydub is installed
+
+        Params:
+            key (str): cache key
+            data (bytes): synthesised audio
+            audio_format (str): format of the audio, 'mp3' or 'wav'
+        
+        Returns:
+            audio_file (str): path of the cached WAV or MP3 file
+        """
+
+        audio_file = os.path.join(AUDIO_CACHE_DIR, f"{key}.{audio_format}")
+        if audio_format == 'mp3' and AudioSegment is not None:
+            # decode once, so replays of the cached clip skip MP3 decoding
+            try:
+                wav = io.BytesIO()
+                AudioSegment.from_file(io.BytesIO(data), format='mp3').export(wav, format='wav')
+                audio_file, data = os.path.join(AUDIO_CACHE_DIR, f"{key}.wav"), wav.getvalue()
+            except (OSError, CouldntDecodeError):
+                logger.warning("could not decode speech to WAV, caching MP3")
+        # written atomically, a concurrent session may be synthesising the same text
+        atomic_write(path=audio_file, data=data)
+        _remember_audio(key=key, audio_file=audio_file)
+        return audio_file
+    
+    def get_audio(self, txt_msg: str, slow: bool = False) -> str:
+        """
+        obtain the audio file for a text message, 
+        synthesising it with Google Text to Speech only if it is not cached
+
+        Params:
+            txt_msg (str): text message
+            slow (bool): read the message slowly
+        
+        Returns:
+            audio_file (str): path of the cached WAV or MP3 file
+        """
+
+        key = self.cache_key(txt_msg=txt_msg, slow=slow)
+        audio_file = self.cached_audio(key=key)
+        if audio_file is not None:
+            return audio_file
+        if self.voice is not None:
+            return self.store_audio(
+                key=key, 
+                data=self.synthesise_locally(txt_msg=txt_msg, slow=slow), 
+                audio_format='wav'
+            )
+
+        from gtts import gTTS
+
+        audio = io.BytesIO()
+        gTTS(text=txt_msg, lang=self.language, slow=slow).write_to_fp(fp=audio)
+        return self.store_audio(key=key, data=audio.getvalue())
+    
+    def synthesise_locally(self, txt_msg: str, slow: bool = False) -> bytes:
+        """
+        synthesise a text message on this machine with Piper, without a network call
+
+        Params:
+            txt_msg (str): text message
+            slow (bool): read the message slowly
+        
+        Returns:
+            bytes: WAV audio
+        """
+
+        audio = io.BytesIO()
+        with wave.open(audio, 'wb') as wav_file:
+            self.voice.synthesize(txt_msg, wav_file, length_scale=1.5 if slow else None)
+        return audio.getvalue()
+    
+    def stream_audio(self, txt_msg: str, slow: bool = False) -> None:
+        """
+        play a text message while Google Text to Speech is still sending it, 
+        caching the complete clip afterwards
+
+        Params:
+            txt_msg (str): text message
+            slow (bool): read the message slowly
+        """
+
+        from gtts import gTTS
+
+        self.playback = subprocess.Popen(
+            self.stream_cmd, 
+            stdin=subprocess.PIPE, 
+            stdout=subprocess.DEVNULL, 
+            stderr=subprocess.DEVNULL
+        )
+        audio = _PlayerFeed(pipe=self.playback.stdin)
+        try:
+            gTTS(text=txt_msg, lang=self.language, slow=slow).write_to_fp(fp=audio)
+        finally:
+            audio.close_pipe()
+        self.store_audio(key=self.cache_key(txt_msg=txt_msg, slow=slow), data=audio.getvalue())
+    
+    def text_to_speech(self, txt_msg: str, block: bool = True, slow: bool = False) -> None:
+        """
+        recite a text in a given language, synthesising it 
+        while the previous message is still playing, or streaming 
+        it into the player if the speaker is idle
 
         Params:
             txt_msg (str): text message
+            block (bool): wait until the message has been played
+            slow (bool): read the message slowly
         """
         
-        audio = gTTS(text=txt_msg, lang=self.language)
-        audio.save(savefile=AUDIO_FILE)
-        audio.timeout = 5
-        audio.speed = 'medium'
-        playsound.playsound(sound=AUDIO_FILE)
-        self.delete_file()   
+        audio_file = self.cached_audio(key=self.cache_key(txt_msg=txt_msg, slow=slow))
+        streamable = self.voice is None and self.stream_cmd is not None
+        if audio_file is None and streamable and not self.is_playing():
+            # nothing to overlap synthesis with, start speaking on the first chunk
+            self.wait()
+            self.stream_audio(txt_msg=txt_msg, slow=slow)
+        else:
+            if audio_file is None:
+                audio_file = self.get_audio(txt_msg=txt_msg, slow=slow)
+            self.wait()
+            self.play_audio_file(audio_file=audio_file)
+        if block:
+            self.wait()
+    
+    def play_audio_file(self, audio_file: str) -> None:
+        """
+        start playing an audio file without waiting for it to finish, 
+        decoded in-process on the open device when miniaudio is installed, 
+        else with the resolved command line player, or with playsound on a 
+        thread where no player for the format is installed
+
+        Params:
+            audio_file (str): path of the audio file
+        """
+
+        if miniaudio is not None:
+            if self.device is None:
+                # opened on first playback, prewarming only synthesises
+                self.device = miniaudio.PlaybackDevice(buffersize_msec=DEVICE_BUFFER_MSEC)
+            finished = threading.Event()
+            stream = miniaudio.stream_with_callbacks(
+                sample_stream=miniaudio.stream_file(filename=audio_file), 
+                end_callback=finished.set
+            )
+            # prime the generator, the device sends frame counts into it
+            next(stream)
+            self.device.start(stream)
+            self.playback = finished
+            return
+        cmd = self.players.get(os.path.splitext(audio_file)[1])
+        if cmd is None:
+            import playsound
+
+            self.playback = threading.Thread(
+                target=playsound.playsound, 
+                kwargs={'sound': audio_file}, 
+                daemon=True
+            )
+            self.playback.start()
+            return
+        self.playback = subprocess.Popen(
+            [*cmd, audio_file], 
+            stdout=subprocess.DEVNULL, 
+            stderr=subprocess.DEVNULL
+        )
+    
+    def is_playing(self) -> bool:
+        """
+        check if a message is still playing
+
+        Returns:
+            bool: if the speaker is busy
+        """
+
+        if self.playback is None:
+            return False
+        if isinstance(self.playback, threading.Event):
+            return not self.playback.is_set()
+        if isinstance(self.playback, threading.Thread):
+            return self.playback.is_alive()
+        return self.playback.poll() is None
+    
+    def wait(self) -> None:
+        """
+        wait for the current message to finish playing
+        """
+
+        if self.playback is None:
+            return
+        if isinstance(self.playback, threading.Event):
+            self.playback.wait()
+            # the stream has ended, let the device play out what it still holds
+            time.sleep(DEVICE_BUFFER_MSEC / 1000)
+            self.device.stop()
+        elif isinstance(self.playback, threading.Thread):
+            self.playback.join()
+        elif self.playback.wait():
+            logger.warning("audio player failed with exit status:: %s", self.playback.returncode)
+        self.playback = None
@@ -0,0 +1,62 @@
+import unittest
+
+from types import SimpleNamespace
+from unittest import mock
+
+from diagnosis import DocJarvis
+
+
+class StubLLM:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def stream(self, *_args, **_kwargs):
+        return (SimpleNamespace(content=chunk) for chunk in self.chunks)
+
+
+class TestStreamDiagnosis(unittest.TestCase):
+    def ask(self, *chunks):
+        with mock.patch('diagnosis.get_llm', return_value=StubLLM(chunks=chunks)):
+            doc = DocJarvis(age=30, gender="Female")
+        return list(doc.stream_diagnosis(usr_msg="I have a headache"))
+
+    def test_json_first_item_on_key_line(self):
+        questions = self.ask(
+            '{"questions": ["How long has it hurt?",\n',
+            '"Do you have a fever?",\n"Are you taking any medicine?"],\n',
+            '"preliminary_differential": ["migraine"]}'
+        )
+        self.assertEqual(questions, [
+            "How long has it hurt?",
+            "Do you have a fever?",
+            "Are you taking any medicine?"
+        ])
+
+    def test_single_line_json(self):
+        questions = self.ask(
+            '{"questions": ["How long has it hurt?", "Do you have a fever?"], '
+            '"preliminary_differential": "migraine"}'
+        )
+        self.assertEqual(questions, ["How long has it hurt?", "Do you have a fever?"])
+
+    def test_numbered_without_trailing_newline(self):
+        questions = self.ask(
+            "Here are three questions:\n1. How long has it hurt?\n",
+            "2. Do you have a fever?\n3. Are you taking any medicine?"
+        )
+        self.assertEqual(questions, [
+            "How long has it hurt?",
+            "Do you have a fever?",
+            "Are you taking any medicine?"
+        ])
+
+    def test_at_most_three_questions(self):
+        questions = self.ask(
+            "1. How long has it hurt?\n2. Do you have a fever?\n",
+            "3. Are you taking any medicine?\n4. Did you sleep well?\n"
+        )
+        self.assertEqual(len(questions), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()